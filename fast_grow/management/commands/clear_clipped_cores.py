@@ -0,0 +1,12 @@
+"""clear_clipped_cores command"""
+from django.core.management.base import BaseCommand
+from fast_grow.models import ClippedCore
+
+
+class Command(BaseCommand):
+    """clear_clipped_cores command"""
+    help = 'Clear the clipped core cache, e.g. after updating the clipper binary'
+
+    def handle(self, *args, **options):
+        deleted, _ = ClippedCore.objects.all().delete()
+        self.stdout.write(f'Deleted {deleted} clipped cores')
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.2 on 2026-10-15 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fast_grow', '0002_fragmentset_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClippedCore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ligand_hash', models.CharField(max_length=64)),
+                ('anchor', models.IntegerField()),
+                ('linker', models.IntegerField()),
+                ('file_type', models.CharField(max_length=3)),
+                ('file_string', models.TextField()),
+            ],
+            options={
+                'unique_together': {('ligand_hash', 'anchor', 'linker', 'file_type')},
+            },
+        ),
+    ]
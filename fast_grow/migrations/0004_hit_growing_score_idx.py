@@ -0,0 +1,17 @@
+# Generated by Django 3.1.2 on 2026-10-15 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fast_grow', '0003_clippedcore'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hit',
+            index=models.Index(fields=['growing', 'score'], name='hit_growing_score_idx'),
+        ),
+    ]
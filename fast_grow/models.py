@@ -1,10 +1,13 @@
 """fast_grow models"""
+import hashlib
 import json
 import os
+import shutil
 from io import BytesIO
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from tempfile import NamedTemporaryFile, TemporaryDirectory, mkdtemp
 from zipfile import ZipFile
 from django.db import models
+from django.db.models.functions import MD5
 
 
 class Status:
@@ -57,6 +60,39 @@ class Ensemble(models.Model):
         self.write(directory.name)
         return directory
 
+    def write_cached(self, cache_path):
+        """Write the ensemble into a directory in the cache unless it is already cached
+
+        The directory is keyed by the ids, names, file types and contents of the complexes of the
+        ensemble.
+
+        :param cache_path: path to the ensemble cache
+        :type cache_path: str
+        :return: path to the cached ensemble directory
+        :rtype: str
+        """
+        # ids alone are not unique across database resets, the contents are part of the key
+        complexes = self.complex_set.order_by('id').annotate(file_hash=MD5('file_string')) \
+            .values_list('id', 'name', 'file_type', 'file_hash')
+        ensemble_key = hashlib.sha256(json.dumps(list(complexes)).encode('utf8')).hexdigest()
+        ensemble_path = os.path.join(cache_path, ensemble_key)
+        if os.path.isdir(ensemble_path):
+            # mark as recently used for the cache sweep
+            os.utime(ensemble_path)
+            return ensemble_path
+
+        os.makedirs(cache_path, exist_ok=True)
+        temp_path = mkdtemp(dir=cache_path)
+        for protein in self.complex_set.order_by('id'):
+            protein.write_temp(temp_dir=temp_path).close()
+        try:
+            # atomic, readers never see a partially written ensemble
+            os.rename(temp_path, ensemble_path)
+        except OSError:
+            # written concurrently by another worker
+            shutil.rmtree(temp_path)
+        return ensemble_path
+
     def write(self, path):
         """Write ensemble proteins to path"""
         for protein in self.complex_set.all():
@@ -238,6 +274,19 @@ class Core(models.Model):
         return core_file
 
 
+class ClippedCore(models.Model):
+    """Model caching the result of clipping a ligand"""
+    # sha256 of the ligand file string
+    ligand_hash = models.CharField(max_length=64)
+    anchor = models.IntegerField()
+    linker = models.IntegerField()
+    file_type = models.CharField(max_length=3)
+    file_string = models.TextField()
+
+    class Meta:
+        unique_together = ['ligand_hash', 'anchor', 'linker', 'file_type']
+
+
 class FragmentSet(models.Model):
     """Model representing a fragment set"""
     name = models.CharField(max_length=255)
@@ -328,6 +377,8 @@ class Growing(models.Model):
                     for hit in self.hit_set.all():
                         hits_file.write(hit.file_string)
                 zip_file.write(hits_path, os.path.join('growing', 'hits.sdf'))
+            # writes the central directory
+            zip_file.close()
         return zip_bytes
 
 
@@ -340,6 +391,10 @@ class Hit(models.Model):
     file_type = models.CharField(max_length=3)
     file_string = models.TextField()
 
+    class Meta:
+        # hits are always listed per growing ordered by score
+        indexes = [models.Index(fields=['growing', 'score'], name='hit_growing_score_idx')]
+
     def dict(self):
         """Convert hit to dict
 
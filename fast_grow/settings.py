@@ -7,4 +7,11 @@ CLIPPER = os.path.join(BASE_DIR, 'bin', 'Clipper')
 INTERACTIONS = os.path.join(BASE_DIR, 'bin', 'InteractionGenerator')
 FAST_GROW = os.path.join(BASE_DIR, 'bin', 'FastGrow')
 
+ENSEMBLE_CACHE = os.path.join(BASE_DIR, 'cache', 'ensembles')
+# seconds a cached ensemble is kept after it was last used
+ENSEMBLE_CACHE_TTL = 7 * 24 * 60 * 60
+
 CHUNK_SIZE = 100
+HIT_BATCH_SIZE = 500
+# number of trailing stderr lines of the fast grow binary kept for error reports
+STDERR_LINES = 100
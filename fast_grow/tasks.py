@@ -1,11 +1,88 @@
 """fast_grow celery tasks"""
+import datetime
 import logging
+import os
+import shutil
+import time
 from celery import shared_task
+from django.db.models import Prefetch
 from .tool_wrappers.preprocessor_wrapper import PreprocessorWrapper
 from .tool_wrappers.clipper_wrapper import ClipperWrapper
 from .tool_wrappers.fast_grow_wrapper import FastGrowWrapper
 from .tool_wrappers.interactions_wrapper import InteractionWrapper
-from .models import Ensemble, Core, SearchPointData, Status, Growing
+from .models import Complex, Ensemble, Core, SearchPointData, Status, Growing
+from .settings import ENSEMBLE_CACHE, ENSEMBLE_CACHE_TTL
+
+
+def run_job(queryset, object_id, job, **fields):
+    """run a job on a model object and record the outcome in its status
+
+    :param queryset: queryset to fetch the object from
+    :type queryset: django.db.models.QuerySet
+    :param object_id: id of the object
+    :type object_id: int
+    :param job: job that takes the object and returns the fields it changed
+    :type job: callable
+    :param fields: fields to update regardless of the outcome
+    :raises Exception: re-raises exceptions encountered in job
+    """
+    obj = queryset.get(id=object_id)
+    objects = queryset.model.objects.filter(id=object_id)
+    try:
+        changed_fields = job(obj)
+        objects.update(status=Status.SUCCESS, **changed_fields, **fields)
+    except Exception as error:
+        logging.error(error)
+        objects.update(status=Status.FAILURE, **fields)
+        raise error
+
+
+def preprocess(ensemble):
+    """preprocess an ensemble
+
+    :param ensemble: ensemble to preprocess
+    :type ensemble: fast_grow.models.Ensemble
+    :return: changed fields
+    :rtype: dict
+    """
+    PreprocessorWrapper.preprocess(ensemble)
+    return {}
+
+
+def clip(core):
+    """clip the ligand of a core
+
+    :param core: core to clip
+    :type core: fast_grow.models.Core
+    :return: changed fields
+    :rtype: dict
+    """
+    ClipperWrapper.clip(core)
+    return {'file_string': core.file_string, 'file_type': core.file_type}
+
+
+def generate(search_point_data):
+    """generate interaction search points
+
+    :param search_point_data: search point data to generate
+    :type search_point_data: fast_grow.models.SearchPointData
+    :return: changed fields
+    :rtype: dict
+    """
+    InteractionWrapper.generate(search_point_data)
+    return {'data': search_point_data.data}
+
+
+def perform_growing(growing):
+    """perform a growing
+
+    :param growing: growing to perform
+    :type growing: fast_grow.models.Growing
+    :return: changed fields
+    :rtype: dict
+    """
+    FastGrowWrapper.grow(growing)
+    return {}
 
 
 @shared_task
@@ -16,16 +93,8 @@ def preprocess_ensemble(ensemble_id):
     :type ensemble_id: int
     :raises Exception: re-raises exceptions encountered in job
     """
-    ensemble = Ensemble.objects.get(id=ensemble_id)
-    try:
-        PreprocessorWrapper.preprocess(ensemble)
-        ensemble.status = Status.SUCCESS
-        ensemble.save()
-    except Exception as error:
-        logging.error(error)
-        ensemble.status = Status.FAILURE
-        ensemble.save()
-        raise error
+    # update() bypasses auto_now
+    run_job(Ensemble.objects.all(), ensemble_id, preprocess, accessed=datetime.date.today())
 
 
 @shared_task
@@ -36,16 +105,11 @@ def clip_ligand(core_id):
     :type core_id: int
     :raises Exception: re-raises exceptions encountered in job
     """
-    core = Core.objects.get(id=core_id)
-    try:
-        ClipperWrapper.clip(core)
-        core.status = Status.SUCCESS
-        core.save()
-    except Exception as error:
-        logging.error(error)
-        core.status = Status.FAILURE
-        core.save()
-        raise error
+    # the core itself is still empty, only the ligand contents are needed
+    cores = Core.objects.select_related('ligand').only(
+        'id', 'anchor', 'linker', 'ligand', 'ligand__name', 'ligand__file_type',
+        'ligand__file_string')
+    run_job(cores, core_id, clip)
 
 
 @shared_task
@@ -56,16 +120,7 @@ def generate_interactions(search_point_id):
     :type search_point_id: int
     :raises Exception: re-raises exceptions encountered in job
     """
-    search_point_data = SearchPointData.objects.get(id=search_point_id)
-    try:
-        InteractionWrapper.generate(search_point_data)
-        search_point_data.status = Status.SUCCESS
-        search_point_data.save()
-    except Exception as error:
-        logging.error(error)
-        search_point_data.status = Status.FAILURE
-        search_point_data.save()
-        raise error
+    run_job(SearchPointData.objects.select_related('ligand', 'complex'), search_point_id, generate)
 
 
 @shared_task
@@ -76,13 +131,18 @@ def grow(growing_id):
     :type growing_id: int
     :raises Exception: re-raises exceptions encountered in job
     """
-    growing = Growing.objects.get(id=growing_id)
-    try:
-        FastGrowWrapper.grow(growing)
-        growing.status = Status.SUCCESS
-        growing.save()
-    except Exception as error:
-        logging.error(error)
-        growing.status = Status.FAILURE
-        growing.save()
-        raise error
+    growings = Growing.objects.select_related('core', 'ensemble', 'fragment_set').prefetch_related(
+        # hits only need the complex names, cached ensembles are written from their own query
+        Prefetch('ensemble__complex_set', queryset=Complex.objects.only('id', 'name', 'ensemble')))
+    run_job(growings, growing_id, perform_growing)
+
+
+@shared_task
+def sweep_ensemble_cache():
+    """remove cached ensembles that have not been used within the cache TTL"""
+    if not os.path.isdir(ENSEMBLE_CACHE):
+        return
+    expired = time.time() - ENSEMBLE_CACHE_TTL
+    for entry in os.scandir(ENSEMBLE_CACHE):
+        if entry.is_dir() and entry.stat().st_mtime < expired:
+            shutil.rmtree(entry.path, ignore_errors=True)
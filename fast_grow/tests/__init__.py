@@ -1,6 +1,9 @@
 """Import test cases here for convenient test discovery"""
+from .clipper_wrapper_tests import ClipperWrapperTests
 from .complex_model_tests import ComplexModelTests
 from .core_model_tests import CoreModelTests
+from .ensemble_model_tests import EnsembleModelTests
+from .fast_grow_wrapper_tests import FastGrowWrapperTests
 from .ligand_model_tests import LigandModelTests
 from .growing_model_tests import GrowingModelTests
 from .status_tests import StatusTests
@@ -0,0 +1,74 @@
+"""Tests for the clipper wrapper"""
+import subprocess
+from unittest.mock import patch
+from django.test import TestCase
+from fast_grow.models import ClippedCore, Core, Ligand
+from fast_grow.tool_wrappers.clipper_wrapper import ClipperWrapper
+
+CORE_STRING = 'core\n\n\n  0  0  0  0  0  0  0  0  0  0999 V2000\nM  END\n$$$$\n'
+
+
+def write_clipped(args):
+    """Stand in for the clipper binary writing a core to the clipped path
+
+    :param args: clipper arguments
+    :type args: list
+    """
+    with open(args[args.index('--clipped') + 1], 'w', encoding='utf8') as clipped_file:
+        clipped_file.write(CORE_STRING)
+
+
+class ClipperWrapperTests(TestCase):
+    """Tests for the clipper wrapper"""
+
+    def setUp(self):
+        """setUp resets the pipe support detected by earlier tests"""
+        ClipperWrapper.use_pipes = None
+        self.ligand = Ligand(name='P86_A_400', file_type='sdf', file_string='ligand\n$$$$\n')
+        self.core = Core(name='P86_A_400_18_2', ligand=self.ligand, anchor=18, linker=2)
+
+    def tearDown(self):
+        """tearDown keeps the detected pipe support from leaking into other tests"""
+        ClipperWrapper.use_pipes = None
+
+    @patch('subprocess.check_call', side_effect=write_clipped)
+    @patch('subprocess.run', side_effect=subprocess.CalledProcessError(64, 'Clipper'))
+    def test_pipes_unsupported(self, run, check_call):
+        """Test falling back to files and remembering that pipes do not work"""
+        self.assertEqual(ClipperWrapper.execute_clipping(self.core, self.ligand), CORE_STRING)
+        self.assertIs(ClipperWrapper.use_pipes, False)
+        ClipperWrapper.execute_clipping(self.core, self.ligand)
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(check_call.call_count, 2)
+
+    @patch('subprocess.check_call', side_effect=write_clipped)
+    @patch('subprocess.run')
+    def test_pipes_invalid_output(self, run, check_call):
+        """Test output that is not a core is treated like a failed piped call"""
+        run.return_value = subprocess.CompletedProcess('Clipper', 0, stdout='Clipper 1.0\n')
+        self.assertEqual(ClipperWrapper.execute_clipping(self.core, self.ligand), CORE_STRING)
+        self.assertIs(ClipperWrapper.use_pipes, False)
+        check_call.assert_called_once()
+
+    @patch('subprocess.check_call')
+    @patch('subprocess.run')
+    def test_pipes_supported(self, run, check_call):
+        """Test a piped success marks pipes as supported and later failures are not retried"""
+        run.return_value = subprocess.CompletedProcess('Clipper', 0, stdout=CORE_STRING)
+        self.assertEqual(ClipperWrapper.execute_clipping(self.core, self.ligand), CORE_STRING)
+        self.assertIs(ClipperWrapper.use_pipes, True)
+
+        run.side_effect = subprocess.CalledProcessError(70, 'Clipper')
+        with self.assertRaises(subprocess.CalledProcessError):
+            ClipperWrapper.execute_clipping(self.core, self.ligand)
+        self.assertIs(ClipperWrapper.use_pipes, True)
+        check_call.assert_not_called()
+
+    @patch('subprocess.check_call')
+    def test_invalid_core_not_cached(self, check_call):
+        """Test a clipping without a valid core fails and is not cached"""
+        ClipperWrapper.use_pipes = False
+        with self.assertRaises(RuntimeError):
+            ClipperWrapper.clip(self.core)
+        check_call.assert_called_once()
+        self.assertEqual(ClippedCore.objects.count(), 0)
@@ -0,0 +1,27 @@
+"""Ensemble model tests"""
+import os
+from tempfile import TemporaryDirectory
+from django.test import TestCase
+from .fixtures import processed_ensemble
+
+
+class EnsembleModelTests(TestCase):
+    """Ensemble model tests"""
+
+    def test_write_cached(self):
+        """Test the ensemble is written into the cache once and reused afterwards"""
+        ensemble = processed_ensemble()
+        with TemporaryDirectory() as cache_path:
+            ensemble_path = ensemble.write_cached(cache_path)
+            self.assertEqual(sorted(os.listdir(ensemble_path)), ['4agm.pdb', '4agn.pdb'])
+            self.assertEqual(ensemble.write_cached(cache_path), ensemble_path)
+            self.assertEqual(os.listdir(cache_path), [os.path.basename(ensemble_path)])
+
+            # same ids and names but different contents must not hit the cache
+            cmplx = ensemble.complex_set.first()
+            cmplx.file_string = 'changed'
+            cmplx.save()
+            changed_path = ensemble.write_cached(cache_path)
+            self.assertNotEqual(changed_path, ensemble_path)
+            with open(os.path.join(changed_path, cmplx.name + '.pdb'), encoding='utf8') as pdb_file:
+                self.assertEqual(pdb_file.read(), 'changed')
@@ -0,0 +1,92 @@
+"""Tests for the fast grow wrapper"""
+import os
+import time
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from fast_grow.tool_wrappers.fast_grow_wrapper import FastGrowWrapper
+from .fixtures import TEST_FILES
+
+
+class FastGrowWrapperTests(TestCase):
+    """Tests for the fast grow wrapper"""
+
+    def test_read_mols(self):
+        """Test reading names, properties and mol strings from a hits file"""
+        hits_path = os.path.join(TEST_FILES, 'P86_A_400_18_2_hits.sdf')
+        with open(hits_path, 'rb') as hits_file:
+            mols = list(FastGrowWrapper.read_mols(hits_file.read()))
+        self.assertEqual(len(mols), 10)
+        name, properties, mol_string = mols[0]
+        self.assertEqual(name, 'P86_A_400_1b32_1b3l_187_7')
+        self.assertEqual(float(properties['Score']), -0.999566)
+        self.assertIn('4AGM', properties)
+        self.assertTrue(mol_string.startswith(name))
+        self.assertTrue(mol_string.endswith('$$$$\n'))
+        with open(hits_path, encoding='utf8') as hits_file:
+            self.assertEqual(''.join(mol[2] for mol in mols), hits_file.read())
+
+    def test_parse_sdf_properties(self):
+        """Test all properties of a mol string are parsed"""
+        mol_string = 'mol\n\n\n  0  0  0  0  0  0  0  0  0  0999 V2000\nM  END\n' \
+            '> <Score>\n-0.5\n\n> <Empty>\n\n> <4AGM>\n1.25\n\n$$$$\n'
+        self.assertEqual(
+            FastGrowWrapper.parse_sdf_properties(mol_string),
+            {'Score': '-0.5', 'Empty': '', '4AGM': '1.25'}
+        )
+        self.assertEqual(FastGrowWrapper.parse_sdf_properties('mol\nM  END\n$$$$\n'), {})
+        # truncated mols
+        self.assertEqual(FastGrowWrapper.parse_sdf_properties('mol\n> <Score>'), {})
+        self.assertEqual(
+            FastGrowWrapper.parse_sdf_properties('mol\n> <Score>\n-1$$$$\n'), {'Score': '-1'})
+
+    def test_read_mols_missing_terminator(self):
+        """Test the last mol of a file without a terminator is still read"""
+        mols = list(FastGrowWrapper.read_mols(b'mol\nM  END\n> <Score>\n-1'))
+        self.assertEqual(len(mols), 1)
+        name, properties, mol_string = mols[0]
+        self.assertEqual(name, 'mol')
+        self.assertEqual(properties, {'Score': '-1'})
+        self.assertEqual(mol_string, 'mol\nM  END\n> <Score>\n-1\n$$$$\n')
+
+    def test_copy_value(self):
+        """Test values are escaped for the postgres COPY text format"""
+        self.assertEqual(FastGrowWrapper.copy_value(None), '\\N')
+        self.assertEqual(FastGrowWrapper.copy_value(-0.5), '-0.5')
+        self.assertEqual(FastGrowWrapper.copy_value({'4agm': None}), '{"4agm": null}')
+        self.assertEqual(
+            FastGrowWrapper.copy_value('a\tb\\c\r\n$$$$\n'), 'a\\tb\\\\c\\r\\n$$$$\\n')
+
+    def test_execute_growing(self):
+        """Test every hit file written by the binary is processed exactly once"""
+        processed = []
+        with TemporaryDirectory() as directory:
+            # stand in for the fast grow binary writing hit chunks and a file that is no hit
+            script = f'cd {directory}; printf mol > a.sdf; sleep 0.2; printf log > log.txt; ' \
+                'printf mol > b.sdf; sleep 0.2; printf mol > c.sdf; echo done >&2'
+            args = ['sh', '-c', script]
+            with patch.object(FastGrowWrapper, 'process_hits',
+                              side_effect=lambda _, paths: processed.extend(paths)):
+                returncode, stderr = async_to_sync(FastGrowWrapper.execute_growing)(
+                    None, args, directory)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stderr, 'done\n')
+        self.assertEqual(sorted(path.name for path in processed), ['a.sdf', 'b.sdf', 'c.sdf'])
+
+    def test_execute_growing_fail(self):
+        """Test the binary is killed when processing hits fails"""
+        with TemporaryDirectory() as directory:
+            pid_path = os.path.join(directory, 'pid')
+            script = f'echo $$ > {pid_path}; printf mol > {directory}/a.sdf; exec sleep 30'
+            args = ['sh', '-c', script]
+            with patch.object(FastGrowWrapper, 'process_hits', side_effect=RuntimeError('hits')):
+                start = time.time()
+                with self.assertRaisesRegex(RuntimeError, 'hits'):
+                    async_to_sync(FastGrowWrapper.execute_growing)(None, args, directory)
+            # killed instead of waiting for the binary to finish on its own
+            self.assertLess(time.time() - start, 10)
+            with open(pid_path, encoding='utf8') as pid_file:
+                pid = int(pid_file.read())
+        with self.assertRaises(ProcessLookupError):
+            os.kill(pid, 0)
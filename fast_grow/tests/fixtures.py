@@ -2,6 +2,8 @@
 import json
 import os
 import subprocess
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 from fast_grow_server import settings
 from fast_grow.models import Core, Complex, Ensemble, FragmentSet, Growing, Hit, Ligand, \
     SearchPointData, Status
@@ -9,6 +11,19 @@ from fast_grow.models import Core, Complex, Ensemble, FragmentSet, Growing, Hit,
 TEST_FILES = os.path.join(settings.BASE_DIR, 'fast_grow', 'tests', 'test_files')
 
 
+def temp_ensemble_cache(test_case):
+    """Redirect the ensemble cache into a temp dir for the duration of a test
+
+    :param test_case: test case to clean up the temp dir after
+    :type test_case: unittest.TestCase
+    """
+    cache_dir = TemporaryDirectory()
+    test_case.addCleanup(cache_dir.cleanup)
+    patcher = patch('fast_grow.tool_wrappers.fast_grow_wrapper.ENSEMBLE_CACHE', cache_dir.name)
+    patcher.start()
+    test_case.addCleanup(patcher.stop)
+
+
 def multi_ensemble():
     """Create an ensemble with multiple complexes
 
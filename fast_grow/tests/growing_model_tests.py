@@ -1,5 +1,5 @@
 """Tests for the growing model"""
-import subprocess
+from zipfile import ZipFile
 from django.test import TestCase
 from .fixtures import processed_ensemble_search_point_growing, delete_test_fragment_set
 
@@ -12,11 +12,12 @@ class GrowingModelTests(TestCase):
         growing = processed_ensemble_search_point_growing()
         try:
             zip_bytes = growing.write_zip_bytes()
-            zip_contents = zip_bytes.getvalue()
-            self.assertIn(bytes('growing/ensemble/4agn.pdb', encoding='utf8'), zip_contents)
-            self.assertIn(bytes('growing/ensemble/4agm.pdb', encoding='utf8'), zip_contents)
-            self.assertIn(bytes('growing/search_points.json', encoding='utf8'), zip_contents)
-            self.assertIn(bytes('growing/P86_A_400_18_2.sdf', encoding='utf8'), zip_contents)
-            self.assertIn(bytes('growing/hits.sdf', encoding='utf8'), zip_contents)
+            with ZipFile(zip_bytes) as zip_file:
+                names = set(zip_file.namelist())
+            self.assertIn('growing/ensemble/4agn.pdb', names)
+            self.assertIn('growing/ensemble/4agm.pdb', names)
+            self.assertIn('growing/search_points.json', names)
+            self.assertIn('growing/P86_A_400_18_2.sdf', names)
+            self.assertIn('growing/hits.sdf', names)
         finally:
             delete_test_fragment_set(growing.fragment_set.name)
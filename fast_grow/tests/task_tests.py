@@ -1,17 +1,28 @@
 """Celery task tests"""
 import os
 import subprocess
+import time
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 from django.test import TestCase
-from fast_grow.models import Complex, Core, Growing, Ligand, SearchPointData, Status, Ensemble
-from fast_grow.tasks import preprocess_ensemble, clip_ligand, grow, generate_interactions
-from fast_grow.settings import PREPROCESSOR, CLIPPER, INTERACTIONS, FAST_GROW
+from fast_grow.models import ClippedCore, Complex, Core, Growing, Ligand, SearchPointData, \
+    Status, Ensemble
+from fast_grow.tasks import preprocess_ensemble, clip_ligand, grow, generate_interactions, \
+    sweep_ensemble_cache
+from fast_grow.tool_wrappers.clipper_wrapper import ClipperWrapper
+from fast_grow.settings import PREPROCESSOR, CLIPPER, INTERACTIONS, FAST_GROW, ENSEMBLE_CACHE_TTL
 from .fixtures import TEST_FILES, multi_ensemble, single_ensemble, single_ensemble_with_ligand, \
-    test_ligand, test_growing, search_point_growing, ensemble_growing, delete_test_fragment_set
+    test_ligand, test_growing, search_point_growing, ensemble_growing, delete_test_fragment_set, \
+    temp_ensemble_cache
 
 
 class TaskTests(TestCase):
     """Celery task tests"""
 
+    def setUp(self):
+        """setUp keeps growings from writing into the real ensemble cache"""
+        temp_ensemble_cache(self)
+
     def test_preprocessor_available(self):
         """Test the preprocessor binary exists at the correct location and is licensed"""
         self.assertTrue(
@@ -101,6 +112,24 @@ class TaskTests(TestCase):
         self.assertIsNotNone(core.file_string)
         self.assertIsNotNone(core.file_type)
 
+    def test_clip_ligand_cached(self):
+        """Test clipping the same ligand twice reuses the cached core"""
+        ligand = test_ligand()
+        core = Core(name='P86_A_400_18_2', ligand=ligand, anchor=18, linker=2)
+        core.save()
+        clip_ligand.run(core.id)
+        cached_core = Core(name='P86_A_400_18_2', ligand=ligand, anchor=18, linker=2)
+        cached_core.save()
+        with patch.object(ClipperWrapper, 'execute_clipping') as execute_clipping:
+            clip_ligand.run(cached_core.id)
+        execute_clipping.assert_not_called()
+
+        self.assertEqual(ClippedCore.objects.count(), 1)
+        core = Core.objects.get(id=core.id)
+        cached_core = Core.objects.get(id=cached_core.id)
+        self.assertEqual(cached_core.status, Status.SUCCESS)
+        self.assertEqual(cached_core.file_string, core.file_string)
+
     def test_clip_fail(self):
         """Test the clipper fails using invalid anchor or linker positions"""
         ligand = test_ligand()
@@ -199,3 +228,20 @@ class TaskTests(TestCase):
             self.assertEqual(growing.status, Status.FAILURE)
         finally:
             delete_test_fragment_set(real_fragment_set_name)
+
+    def test_sweep_ensemble_cache(self):
+        """Test only cached ensembles unused for longer than the TTL are removed"""
+        with TemporaryDirectory() as cache_path:
+            os.mkdir(os.path.join(cache_path, 'fresh'))
+            old_path = os.path.join(cache_path, 'old')
+            os.mkdir(old_path)
+            expired = time.time() - ENSEMBLE_CACHE_TTL - 60
+            os.utime(old_path, (expired, expired))
+            with patch('fast_grow.tasks.ENSEMBLE_CACHE', cache_path):
+                sweep_ensemble_cache.run()
+            self.assertEqual(os.listdir(cache_path), ['fresh'])
+
+            missing_path = os.path.join(cache_path, 'missing')
+            with patch('fast_grow.tasks.ENSEMBLE_CACHE', missing_path):
+                sweep_ensemble_cache.run()
+            self.assertFalse(os.path.exists(missing_path))
@@ -6,7 +6,7 @@ from fast_grow_server import celery_app
 from fast_grow.models import Core, Status
 from .fixtures import TEST_FILES, processed_single_ensemble, test_ligand, test_core, \
     test_fragment_set, processed_growing, processed_search_points, \
-    processed_ensemble_search_point_growing, delete_test_fragment_set
+    processed_ensemble_search_point_growing, delete_test_fragment_set, temp_ensemble_cache
 
 
 class ViewTests(TestCase):
@@ -15,6 +15,7 @@ class ViewTests(TestCase):
     def setUp(self):
         """setUp ensures no celery tasks are actually submitted by the views"""
         celery_app.conf.update(CELERY_ALWAYS_EAGER=True)
+        temp_ensemble_cache(self)
 
     def test_create_complex(self):
         """Test the complex create route creates a complex model"""
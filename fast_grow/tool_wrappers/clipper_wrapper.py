@@ -1,32 +1,144 @@
 """A django friendly wrapper around the clipper binary"""
+import hashlib
 import logging
 import subprocess
 from tempfile import NamedTemporaryFile
+from fast_grow.models import ClippedCore
 from fast_grow.settings import CLIPPER
 
 
 class ClipperWrapper:
     """A django friendly wrapper around the clipper binary"""
 
+    # whether the clipper binary reads and writes through pipes, None until known
+    use_pipes = None
+
     @staticmethod
     def clip(core):
         """clip a core using the clipper binary
 
+        Clipped cores are cached by ligand contents, anchor and linker so the same clipping is only
+        ever executed once. Only cores that passed check_core are cached. The cache is not
+        invalidated automatically, clear it with the clear_clipped_cores command after changing
+        the clipper binary.
+
         :param core: core to clip
         :type core: fast_grow.models.Core
         """
         ligand = core.ligand
+        ligand_hash = hashlib.sha256(ligand.file_string.encode('utf8')).hexdigest()
+        clipped_core = ClippedCore.objects.filter(
+            ligand_hash=ligand_hash, anchor=core.anchor, linker=core.linker,
+            file_type=ligand.file_type).first()
+        if clipped_core is None:
+            clipped_core, _ = ClippedCore.objects.get_or_create(
+                ligand_hash=ligand_hash, anchor=core.anchor, linker=core.linker,
+                file_type=ligand.file_type,
+                defaults={'file_string': ClipperWrapper.execute_clipping(core, ligand)})
+        core.file_string = clipped_core.file_string
+        core.file_type = clipped_core.file_type
+
+    @staticmethod
+    def execute_clipping(core, ligand):
+        """execute the clipper binary
+
+        :param core: core defining the clipping
+        :type core: fast_grow.models.Core
+        :param ligand: ligand to clip
+        :type ligand: fast_grow.models.Ligand
+        :return: clipped core file string
+        :rtype: str
+        """
+        if ClipperWrapper.use_pipes is False:
+            return ClipperWrapper.clip_files(core, ligand)
+        try:
+            file_string = ClipperWrapper.clip_piped(core, ligand)
+        except (subprocess.CalledProcessError, RuntimeError) as error:
+            logging.debug('piped clipping failed: %s', error)
+            if ClipperWrapper.use_pipes:
+                # pipes work, so this is an actual clipping error
+                raise
+            file_string = ClipperWrapper.clip_files(core, ligand)
+            # only the piped call failed, the binary does not support pipes
+            ClipperWrapper.use_pipes = False
+            return file_string
+        ClipperWrapper.use_pipes = True
+        return file_string
+
+    @staticmethod
+    def clip_piped(core, ligand):
+        """clip a ligand passing it to the clipper binary through stdin and stdout
+
+        :param core: core defining the clipping
+        :type core: fast_grow.models.Core
+        :param ligand: ligand to clip
+        :type ligand: fast_grow.models.Ligand
+        :return: clipped core file string
+        :rtype: str
+        """
+        args = ClipperWrapper.args(core, '/dev/stdin', '/dev/stdout')
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(' '.join(args))
+        completed_process = subprocess.run(
+            args, input=ligand.file_string, stdout=subprocess.PIPE, encoding='utf8', check=True)
+        # stdout may contain anything the binary prints, only accept an actual core
+        return ClipperWrapper.check_core(completed_process.stdout, ligand.file_type)
+
+    @staticmethod
+    def check_core(file_string, file_type):
+        """check that a clipper output is a plausible core
+
+        :param file_string: clipper output
+        :type file_string: str
+        :param file_type: expected file type of the output
+        :type file_type: str
+        :return: the unchanged clipper output
+        :rtype: str
+        :raises RuntimeError: if the output is empty or not a complete SDF
+        """
+        if not file_string.strip():
+            raise RuntimeError('Clipper did not write a core')
+        if file_type == 'sdf' and not file_string.rstrip().endswith('$$$$'):
+            raise RuntimeError('Clipper did not write a complete SDF core')
+        return file_string
+
+    @staticmethod
+    def clip_files(core, ligand):
+        """clip a ligand passing it to the clipper binary through temporary files
+
+        :param core: core defining the clipping
+        :type core: fast_grow.models.Core
+        :param ligand: ligand to clip
+        :type ligand: fast_grow.models.Ligand
+        :return: clipped core file string
+        :rtype: str
+        """
         ligand_file = ligand.write_temp()
         with NamedTemporaryFile(mode='w+', suffix='.' + ligand.file_type) as temp_file:
-            args = [
-                CLIPPER,
-                '--ligand', ligand_file.name,
-                '--clipped', temp_file.name,
-                '--anchorposition', str(core.anchor),
-                '--linkposition', str(core.linker)
-            ]
-            logging.debug(' '.join(args))
+            args = ClipperWrapper.args(core, ligand_file.name, temp_file.name)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(' '.join(args))
             subprocess.check_call(args)
             temp_file.seek(0)
-            core.file_string = temp_file.read()
-            core.file_type = ligand.file_type
+            return ClipperWrapper.check_core(temp_file.read(), ligand.file_type)
+
+    @staticmethod
+    def args(core, ligand_path, clipped_path):
+        """build the clipper binary arguments
+
+        :param core: core defining the clipping
+        :type core: fast_grow.models.Core
+        :param ligand_path: path to read the ligand from
+        :type ligand_path: str
+        :param clipped_path: path to write the clipped core to
+        :type clipped_path: str
+        :return: clipper arguments
+        :rtype: list
+        """
+        return [
+            CLIPPER,
+            '--ligand', ligand_path,
+            '--clipped', clipped_path,
+            '--anchorposition', str(core.anchor),
+            '--linkposition', str(core.linker)
+        ]
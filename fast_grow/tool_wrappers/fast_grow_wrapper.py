@@ -1,15 +1,31 @@
 """A django model friendly wrapper around the fast grow binary"""
+import asyncio
+import collections
+import io
 import json
 import logging
+import mmap
+import os
+import re
 import subprocess
-import time
 from pathlib import Path
 from tempfile import NamedTemporaryFile, TemporaryDirectory
-from django.db import transaction
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection, transaction
+from inotify_simple import INotify, flags
 from fast_grow_server.settings import DATABASES
-from fast_grow.settings import FAST_GROW, CHUNK_SIZE
+from fast_grow.settings import FAST_GROW, CHUNK_SIZE, ENSEMBLE_CACHE, HIT_BATCH_SIZE, \
+    STDERR_LINES
 from fast_grow.models import Hit
 
+NON_BLANK = re.compile(rb'\S')
+# connection to the fragment set databases, these do not change while the server is running
+DATABASE_ARGS = [
+    '--username', DATABASES['default']['USER'],
+    '--port', DATABASES['default']['PORT'],
+    '--host', DATABASES['default']['HOST']
+]
+
 
 class FastGrowWrapper:
     """A django model friendly wrapper around the fast grow binary"""
@@ -33,29 +49,95 @@ class FastGrowWrapper:
                 '--chunksize', str(CHUNK_SIZE),
                 '--writemode', '1',
                 '--databasetype', '0',
-                '--username', DATABASES['default']['USER'],
-                '--port', DATABASES['default']['PORT'],
-                '--host', DATABASES['default']['HOST']
+                *DATABASE_ARGS
             ]
-            ensemble_dir = growing.ensemble.write_temp()
-            args.extend(['--ensemble', ensemble_dir.name])
+            args.extend(['--ensemble', growing.ensemble.write_cached(ENSEMBLE_CACHE)])
             if growing.search_points:
                 search_points_file = FastGrowWrapper.write_temp_search_points(growing.search_points)
                 args.extend(['--interactions', search_points_file.name])
-            logging.info(' '.join(args))
-            process = subprocess.Popen(args)
-            seen = set()
-            while True:
-                FastGrowWrapper.process_hits(growing, directory, seen)
-                time.sleep(1)
-                if process.poll() is not None:
-                    break
-            FastGrowWrapper.process_hits(growing, directory, seen)
-
-            if process.returncode > 0:
-                stdout, stderr = process.communicate()
-                raise subprocess.CalledProcessError(
-                    process.returncode, args, output=stdout, stderr=stderr)
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(' '.join(args))
+            # keeps the ORM calls of execute_growing on this thread and its connection
+            returncode, stderr = async_to_sync(FastGrowWrapper.execute_growing)(
+                growing, args, directory)
+            if returncode > 0:
+                logging.error(stderr)
+                raise subprocess.CalledProcessError(returncode, args, stderr=stderr)
+
+    @staticmethod
+    async def execute_growing(growing, args, directory):
+        """Execute the fast grow binary and add hits as soon as hit files are written
+
+        :param growing: growing to save hits to
+        :type growing: fast_grow.models.Growing
+        :param args: fast grow binary arguments
+        :type args: list
+        :param directory: directory the hit files are written to
+        :type directory: str
+        :return: fast grow return code and the last lines of its stderr
+        :rtype: tuple
+        """
+        # the ORM is synchronous only and must not run inside the event loop
+        process_hits = sync_to_async(FastGrowWrapper.process_hits, thread_sensitive=True)
+        loop = asyncio.get_running_loop()
+        event_queue = asyncio.Queue()
+        process = None
+        stderr_task = None
+        with INotify() as inotify:
+            # only react to hit files once they have been completely written
+            inotify.add_watch(directory, flags.CLOSE_WRITE | flags.MOVED_TO)
+            loop.add_reader(
+                inotify.fileno(), lambda: event_queue.put_nowait(inotify.read(timeout=0)))
+            try:
+                process = await asyncio.create_subprocess_exec(*args, stderr=subprocess.PIPE)
+                # keep draining stderr so the binary never blocks on a full pipe
+                stderr_lines = collections.deque(maxlen=STDERR_LINES)
+                stderr_task = asyncio.ensure_future(
+                    FastGrowWrapper.read_lines(process.stderr, stderr_lines))
+                exit_task = asyncio.ensure_future(process.wait())
+                while not exit_task.done():
+                    event_task = asyncio.ensure_future(event_queue.get())
+                    await asyncio.wait({exit_task, event_task}, return_when=asyncio.FIRST_COMPLETED)
+                    if not event_task.done():
+                        event_task.cancel()
+                        continue
+                    events = event_task.result()
+                    await process_hits(growing, FastGrowWrapper.hit_paths(directory, events))
+                loop.remove_reader(inotify.fileno())
+                # drain files written right before the process exited
+                while not event_queue.empty():
+                    events = event_queue.get_nowait()
+                    await process_hits(growing, FastGrowWrapper.hit_paths(directory, events))
+                await process_hits(
+                    growing, FastGrowWrapper.hit_paths(directory, inotify.read(timeout=0)))
+                await stderr_task
+            finally:
+                loop.remove_reader(inotify.fileno())
+                if process is not None and process.returncode is None:
+                    # do not leave the binary writing into a directory that is about to be deleted
+                    process.kill()
+                    await process.wait()
+                if stderr_task is not None and not stderr_task.done():
+                    stderr_task.cancel()
+        return process.returncode, ''.join(stderr_lines)
+
+    @staticmethod
+    async def read_lines(stream, lines):
+        """Read a stream line by line until it is closed
+
+        :param stream: stream to read
+        :type stream: asyncio.StreamReader
+        :param lines: collection to append the decoded lines to
+        :type lines: collections.deque
+        """
+        # read chunks instead of lines, readline fails on lines longer than the stream limit
+        partial_line = b''
+        while chunk := await stream.read(65536):
+            chunk_lines = (partial_line + chunk).split(b'\n')
+            partial_line = chunk_lines.pop()
+            lines.extend(line.decode('utf8', errors='replace') + '\n' for line in chunk_lines)
+        if partial_line:
+            lines.append(partial_line.decode('utf8', errors='replace'))
 
     @staticmethod
     def write_temp_search_points(search_points):
@@ -72,21 +154,33 @@ class FastGrowWrapper:
         return temp_file
 
     @staticmethod
-    def process_hits(growing, directory_path, seen_files):
-        """Process unseen hit files
+    def hit_paths(directory_path, events):
+        """Get the paths of hit files reported by inotify events
 
-        :param growing: growing to save hits to
-        :type growing: fast_grow.models.Growing
         :param directory_path: path to hits files
         :type directory_path: str
-        :param seen_files: hits files already processed
-        :type seen_files: set
+        :param events: inotify events of the hits directory
+        :type events: list
+        :return: paths to new hits files
+        :rtype: list
+        """
+        paths = [Path(directory_path) / event.name for event in events]
+        return [path for path in paths if path.suffix == '.sdf']
+
+    @staticmethod
+    def process_hits(growing, hit_paths):
+        """Process new hit files
+
+        :param growing: growing to save hits to
+        :type growing: fast_grow.models.Growing
+        :param hit_paths: paths to hits files that have not been processed yet
+        :type hit_paths: list
         """
+        if not hit_paths:
+            return
         with transaction.atomic():
-            for hit_file in Path(directory_path).glob('*.sdf'):
-                if hit_file not in seen_files:
-                    FastGrowWrapper.add_hits(growing, hit_file)
-                    seen_files.add(hit_file)
+            for hit_path in hit_paths:
+                FastGrowWrapper.add_hits(growing, hit_path)
 
     @staticmethod
     def add_hits(growing, hits_path):
@@ -97,54 +191,148 @@ class FastGrowWrapper:
         :param hits_path: path to hits file
         :type hits_path: str
         """
-        with open(hits_path, encoding='utf8') as hits_file:
-            data = hits_file.read()
-        mol_strings = [m + '$$$$\n' for m in data.split('$$$$\n') if m.strip()]
-        for mol_string in mol_strings:
-            hit_name = FastGrowWrapper.get_mol_string_name(mol_string)[:254]
-            hit_score = FastGrowWrapper.get_mol_string_prop('Score', mol_string, cast_to=float)
-            ensemble_scores = {}
-            if growing.ensemble.complex_set.count() > 1:
-                for cmplx in growing.ensemble.complex_set.all():
-                    ensemble_scores[cmplx.name] = \
-                        FastGrowWrapper.get_mol_string_prop(cmplx.name.upper(), mol_string, cast_to=float)
-            hit = Hit(
+        complexes = list(growing.ensemble.complex_set.all())
+        # ensemble scores are only reported for ensembles with more than one complex
+        complex_names = [(c.name, c.name.upper()) for c in complexes] if len(complexes) > 1 else []
+        hits = []
+        with open(hits_path, 'rb') as hits_file:
+            if os.fstat(hits_file.fileno()).st_size == 0:
+                # empty files can not be mapped
+                return
+            with mmap.mmap(hits_file.fileno(), 0, access=mmap.ACCESS_READ) as hits_buffer:
+                mols = list(FastGrowWrapper.read_mols(hits_buffer))
+        for hit_name, properties, mol_string in mols:
+            hits.append(Hit(
                 growing=growing,
-                name=hit_name,
-                score=hit_score,
+                name=hit_name[:254],
+                score=FastGrowWrapper.to_float(properties.get('Score')),
                 file_string=mol_string,
                 file_type='sdf',
-                ensemble_scores=ensemble_scores
-            )
-            hit.save()
+                ensemble_scores={
+                    name: FastGrowWrapper.to_float(properties.get(prop))
+                    for name, prop in complex_names
+                }
+            ))
+        FastGrowWrapper.save_hits(hits)
 
     @staticmethod
-    def get_mol_string_name(mol_string):
-        """get the mol name out of an SDF string
+    def save_hits(hits):
+        """Save hits using COPY on postgres and bulk inserts on other databases
 
-        :param mol_string: string of an SDF
-        :type mol_string: str
-        :return: name of the mol in the SDF
+        :param hits: unsaved hits
+        :type hits: list
+        """
+        if connection.vendor != 'postgresql':
+            Hit.objects.bulk_create(hits, batch_size=HIT_BATCH_SIZE)
+            return
+        columns = ['growing_id', 'name', 'score', 'ensemble_scores', 'file_type', 'file_string']
+        buffer = io.StringIO()
+        for hit in hits:
+            row = [FastGrowWrapper.copy_value(getattr(hit, column)) for column in columns]
+            buffer.write('\t'.join(row) + '\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {Hit._meta.db_table} ({", ".join(columns)}) FROM STDIN', buffer)
+
+    @staticmethod
+    def copy_value(value):
+        """Convert a value to a field of the postgres COPY text format
+
+        :param value: value to convert
+        :return: escaped field
         :rtype: str
         """
-        return mol_string.split('\n')[0].strip()
+        if value is None:
+            return '\\N'
+        if isinstance(value, dict):
+            value = json.dumps(value)
+        return str(value).replace('\\', '\\\\').replace('\t', '\\t') \
+            .replace('\n', '\\n').replace('\r', '\\r')
 
     @staticmethod
-    def get_mol_string_prop(prop, mol_string, cast_to=None):
-        """get a property out of an SDF mol string
+    def read_mols(sdf_buffer):
+        """Read the mols of an SDF in a single pass over the buffer
+
+        :param sdf_buffer: SDF contents, e.g. a memory map of an SDF file
+        :type sdf_buffer: bytes
+        :return: generator of mol name, mol properties and mol string
+        :rtype: generator
+        """
+        for block in FastGrowWrapper.mol_blocks(sdf_buffer):
+            try:
+                mol_string = str(block, 'utf8')
+            finally:
+                # a view left in a traceback would keep the buffer from being closed
+                block.release()
+            if not mol_string.endswith('$$$$\n'):
+                # tolerate a missing terminator after the last mol
+                mol_string += '$$$$\n' if mol_string.endswith('\n') else '\n$$$$\n'
+            yield (
+                mol_string[:mol_string.find('\n')].strip(),
+                FastGrowWrapper.parse_sdf_properties(mol_string),
+                mol_string
+            )
+
+    @staticmethod
+    def parse_sdf_properties(mol_string):
+        """Parse all properties of an SDF mol string in a single pass
 
-        :param prop: property to extract
-        :type prop: str
         :param mol_string: string of an SDF
         :type mol_string: str
-        :param cast_to: type to cast prop to
-        :return: property
+        :return: property values by property name
+        :rtype: dict
+        """
+        if mol_string.endswith('$$$$\n'):
+            # the terminator must not end up in the value of the last property
+            mol_string = mol_string[:-5]
+        properties = {}
+        # property headers are lines of the form "> <TAG>" followed by a value line
+        tag_start = mol_string.find('\n> <')
+        while tag_start != -1:
+            tag_end = mol_string.find('\n', tag_start + 1)
+            if tag_end == -1:
+                # header without a value line
+                break
+            value_end = mol_string.find('\n', tag_end + 1)
+            if value_end == -1:
+                value_end = len(mol_string)
+            tag = mol_string[tag_start + 4:tag_end].rstrip()[:-1]
+            properties[tag] = mol_string[tag_end + 1:value_end].strip()
+            tag_start = mol_string.find('\n> <', value_end)
+        return properties
+
+    @staticmethod
+    def mol_blocks(sdf_buffer):
+        """Split an SDF buffer into mol blocks without copying
+
+        :param sdf_buffer: SDF contents
+        :type sdf_buffer: bytes
+        :return: generator of views of the non-blank mol blocks including their terminator
+        :rtype: generator
+        """
+        with memoryview(sdf_buffer) as view:
+            start = 0
+            size = len(view)
+            while start < size:
+                content_end = sdf_buffer.find(b'$$$$\n', start)
+                if content_end == -1:
+                    content_end = end = size
+                else:
+                    end = content_end + 5
+                if NON_BLANK.search(view[start:content_end]):
+                    yield view[start:end]
+                start = end
+
+    @staticmethod
+    def to_float(value):
+        """Cast an SDF property value to float
+
+        :param value: property value
+        :type value: str
+        :return: float value or None if the property was missing
+        :rtype: float
         """
-        for element in mol_string.split('> <'):
-            property_pair = [e.strip() for e in element.replace('$$$$', '').split('>\n')]
-            if property_pair[0] != prop:
-                continue
-            if cast_to is not None:
-                property_pair[1] = cast_to(property_pair[1])
-            return property_pair[1]
-        return None
+        if value is None:
+            return None
+        return float(value)
@@ -40,7 +40,8 @@ class InteractionWrapper:
             '--ligand', ligand_file.name,
             '--outdir', output_directory
         ]
-        logging.debug(' '.join(args))
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(' '.join(args))
         subprocess.check_call(args)
 
     @staticmethod
@@ -51,7 +51,8 @@ class PreprocessorWrapper:
             ]
             if ligand_file:
                 args.extend(['--ligand', ligand_file.name])
-            logging.debug(' '.join(args))
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(' '.join(args))
             subprocess.check_call(args)
 
     @staticmethod
@@ -126,5 +126,11 @@ STATIC_URL = '/static/'
 
 CELERY_BROKER_URL = 'redis://localhost:6379'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379'
+CELERY_BEAT_SCHEDULE = {
+    'sweep-ensemble-cache': {
+        'task': 'fast_grow.tasks.sweep_ensemble_cache',
+        'schedule': 24 * 60 * 60,
+    },
+}
 
 PDB_FILE_URL = 'https://files.rcsb.org/download/{}.pdb'